@@ -1,65 +1,55 @@
 # main.py
-import json
+import asyncio
+import atexit
+import logging
+import random
 import re
+import threading
 import time
-from typing import Dict, Any, Optional
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Awaitable, Callable, Tuple, TypeVar
 
+import httpx
+import orjson
 import streamlit as st
-from openai import OpenAI
+from openai import (AsyncOpenAI, APIConnectionError, APIStatusError, AuthenticationError, NotFoundError,
+                    PermissionDeniedError)
+
+from quiz_lib import (
+    BATCH_SCHEMA,
+    FOCUS_HINTS,
+    MODEL_CANDIDATES,
+    QUESTION_CACHE_TTL,
+    SYSTEM_SCHEMA,
+    disk_cache_get,
+    disk_cache_put,
+    parse_model_json,
+    question_cache_key,
+    topic_tag,
+    validate_question,
+)
 
 # ============== APP CONFIG ==============
 st.set_page_config(page_title="World History Quiz", page_icon="🌍", layout="centered")
 DEBUG = True  # βάλ' το False όταν τελειώσουμε
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG if DEBUG else logging.WARNING)
 
 # ============== THEME / CSS ==============
-st.markdown(r"""
-<style>
-html, body {
-  background: linear-gradient(160deg, #1a2540 0%, #0d1733 70%, #0a0f1f 100%) !important;
-  color: #f3f5ff !important;
-}
-h1,h2,h3,h4 { color: #ffffff !important; }
-
-.quiz-card {
-  background: rgba(255,255,255,0.08);
-  border: 1px solid rgba(255,255,255,0.15);
-  border-radius: 14px;
-  padding: 1.2rem;
-  box-shadow: 0 4px 12px rgba(0,0,0,0.4);
-}
-
-.badge {
-  background:#21335c;
-  color:#d9e4ff;
-  border:1px solid rgba(255,255,255,.15);
-}
-
-.score-chip {
-  background:#1c2b53;
-  color:#f1f4ff;
-}
-
-div.stButton > button {
-  border-radius: 10px;
-  font-weight: 600;
-  color: white !important;
-  background: linear-gradient(135deg, #2563eb 0%, #1d4ed8 100%) !important;
-  border: none;
-}
-div.stButton > button:hover {
-  background: linear-gradient(135deg, #1d4ed8 0%, #1e40af 100%) !important;
-}
+@st.cache_data(show_spinner=False)
+def load_css() -> str:
+    """
+    Reads style.css once per server process (the file sits next to main.py),
+    minified, since it is re-sent to the browser on every rerun.
+    """
+    css = (Path(__file__).parent / "style.css").read_text(encoding="utf-8")
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    return re.sub(r"\s*([{}:;,>])\s*", r"\1", css).strip()
 
-[data-baseweb="toast"] {
-  border-radius: 10px !important;
-  font-weight: 500 !important;
-  color: white !important;
-}
-[data-baseweb="toast"][kind="positive"] { background-color: #22c55e !important; }
-[data-baseweb="toast"][kind="negative"] { background-color: #ef4444 !important; }
-[data-baseweb="toast"][kind="warning"]  { background-color: #f59e0b !important; }
-</style>
-""", unsafe_allow_html=True)
+st.markdown(f"<style>{load_css()}</style>", unsafe_allow_html=True)
 
 
                               
@@ -70,134 +60,306 @@ if not API_KEY:
     st.error("❌ Missing OPENAI_API_KEY in Streamlit Secrets.")
     st.stop()
 
-client = OpenAI(api_key=API_KEY)
-MODEL_CANDIDATES = ["gpt-4o-mini", "gpt-4o", "gpt-4o-mini-2024-07-18", "gpt-4o-2024-08-06"]
+T = TypeVar("T")
 
-# ============== HELPERS ==============
-def extract_json_block(text: str) -> str:
+
+@st.cache_resource(show_spinner=False)
+def _event_loop() -> asyncio.AbstractEventLoop:
     """
-    Robust extraction of a JSON object from LLM text.
-    - Tries fenced ```json blocks
-    - Tries plain JSON
-    - Falls back to balanced-braces scanning
+    One long-lived event loop on a daemon thread, shared by every session.
+    The pooled connections belong to this loop, so all OpenAI calls run on it
+    (asyncio.run would close its loop after each rerun, and the pool with it).
     """
-    if not text:
-        raise ValueError("Empty model response.")
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="openai-loop", daemon=True).start()
+    return loop
+
+
+@st.cache_resource(show_spinner=False)
+def _http_pool() -> httpx.AsyncClient:
+    """Keep-alive HTTP/2 connection pool, reused across reruns to skip the TLS handshake."""
+    loop = _event_loop()
+    http = httpx.AsyncClient(
+        http2=True,  # concurrent requests multiplex over one TLS connection
+        limits=httpx.Limits(max_keepalive_connections=16, max_connections=32, keepalive_expiry=30.0),
+        timeout=httpx.Timeout(30.0, connect=5.0),
+    )
+    atexit.register(lambda: asyncio.run_coroutine_threadsafe(http.aclose(), loop).result(timeout=5))
+    return http
 
-    txt = text.strip()
 
-    # 1) fenced ```json ... ```
-    m = re.search(r"```json\s*(\{.*?\})\s*```", txt, flags=re.S | re.I)
-    if m:
-        return m.group(1)
-    m = re.search(r"```\s*(\{.*?\})\s*```", txt, flags=re.S | re.I)
-    if m:
-        return m.group(1)
+def _run_async(coro: Awaitable[T], inflight: Optional[List[Future]] = None) -> T:
+    """
+    Runs `coro` on the shared loop and blocks until it finishes. The handle is
+    appended to `inflight`, if given, so the caller can cancel it later.
+    """
+    fut = asyncio.run_coroutine_threadsafe(coro, _event_loop())
+    if inflight is not None:
+        inflight.append(fut)
+    return fut.result()
 
-    # 2) try direct JSON
-    try:
-        json.loads(txt)
-        return txt
-    except Exception:
-        pass
-
-    # 3) balanced braces scan (χωρίς recursion)
-    start = txt.find("{")
-    if start == -1:
-        raise ValueError("No JSON object found in model response.")
-    stack = 0
-    end: Optional[int] = None
-    for i, ch in enumerate(txt[start:], start=start):
-        if ch == "{":
-            stack += 1
-        elif ch == "}":
-            stack -= 1
-            if stack == 0:
-                end = i + 1
-                break
-    if end is None:
-        raise ValueError("Unbalanced JSON braces in model response.")
-    return txt[start:end]
 
+@st.cache_resource(show_spinner=False)
+def get_openai_client() -> AsyncOpenAI:
+    """Single OpenAI client for the whole app, kept across Streamlit reruns."""
+    # τα retries τα κάνει το _complete_json, όχι το SDK
+    return AsyncOpenAI(api_key=API_KEY, http_client=_http_pool(), max_retries=0)
+
+# χτίζεται εδώ, στο script thread· το loop thread βρίσκει πάντα έτοιμο cache hit
+get_openai_client()
 
-def validate_question(obj: Dict[str, Any]) -> Dict[str, Any]:
+# ~200 tokens is enough for one question; the cap bounds tail latency on verbose replies
+MAX_TOKENS_PER_QUESTION = 250
+SAMPLING = {"temperature": 0.6, "top_p": 0.9, "stop": ["\n\n\n"]}
+MAX_CONCURRENCY = 10  # max in-flight OpenAI requests per quiz build
+MAX_ATTEMPTS = 3  # per model, for transient errors only (429 / 5xx / network)
+RETRY_BASE_DELAY = 0.5  # seconds, doubled after every failed attempt
+ASKED_HISTORY = 5  # how many recent topics the prompt asks the model to avoid
+PENDING_TIMEOUT = 120  # seconds to wait on a background batch the user is blocked on
+
+
+@st.cache_resource(show_spinner=False)
+def _model_memo() -> Dict[str, str]:
     """
-    Expected:
-    {
-      "question": str,
-      "options": [str, str, str, str],
-      "correct_index": int (0..3),
-      "explanation": str
-    }
+    Remembers the model to start with once an earlier candidate turned out
+    to be unavailable (404). Availability depends on the API key, which the
+    whole app shares, so this is app-wide, not per session.
     """
-    for k in ("question", "options", "correct_index", "explanation"):
-        if k not in obj:
-            raise ValueError(f"Missing field: {k}")
-
-    q = str(obj["question"]).strip()
-    options = [str(x).strip() for x in obj["options"] if str(x).strip()]
-    if len(options) < 2:
-        raise ValueError("Not enough options.")
-    # normalize to exactly 4 options
-    if len(options) > 4:
-        options = options[:4]
-    while len(options) < 4:
-        options.append(f"None of the above {len(options)}")
-
-    ci = obj["correct_index"]
-    if not isinstance(ci, int) or not (0 <= ci < len(options)):
-        raise ValueError("Invalid correct_index.")
-
-    exp = str(obj["explanation"]).strip()
-    if len(exp) < 3:
-        exp = "No explanation provided."
-
-    return {"question": q, "options": options, "correct_index": ci, "explanation": exp}
-
-
-SYSTEM_SCHEMA = """You are a quiz author. Output ONLY one JSON object with fields:
-- "question": string (concise, single-sentence)
-- "options": array of 4 short, plausible, distinct answers (strings)
-- "correct_index": integer 0..3 (index in "options")
-- "explanation": string (1–2 sentences, factual, neutral)
-No markdown, no code fences, no commentary. JSON only.
-"""
+    return {}
+
+
+def models_to_try() -> List[str]:
+    """MODEL_CANDIDATES, with the first known-available model moved to the front."""
+    good = _model_memo().get("good")
+    if not good:
+        return list(MODEL_CANDIDATES)
+    return [good] + [m for m in MODEL_CANDIDATES if m != good]
+
+# ============== OPENAI CALLS ==============
+def _is_transient(e: Exception) -> bool:
+    if isinstance(e, APIConnectionError):  # includes timeouts
+        return True
+    return isinstance(e, APIStatusError) and (e.status_code == 429 or e.status_code >= 500)
 
-def call_openai_for_question(theme: str, era: str, difficulty: str) -> Dict[str, Any]:
+
+async def _stream_completion(request: Dict[str, Any], progress: List[int]) -> Tuple[str, Optional[str]]:
+    """
+    Streams a completion and returns (content, finish_reason). progress[0]
+    counts received chunks, so the script thread can show that text is coming.
+    """
+    progress[0] = 0
+    parts = []
+    finish_reason = None
+    stream = await get_openai_client().chat.completions.create(**request, stream=True)
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        choice = chunk.choices[0]
+        parts.append(choice.delta.content or "")
+        finish_reason = choice.finish_reason or finish_reason
+        progress[0] += 1
+    return "".join(parts), finish_reason
+
+
+async def _complete_json(system: str, user_msg: str, timeout: float, max_tokens: int, parse: Callable[[Any], T],
+                         progress: Optional[List[int]] = None) -> T:
+    """
+    JSON-mode chat completion, passed through `parse`. Walks models_to_try():
+    transient errors and bad output (truncated, unparseable, invalid) are
+    retried on the same model with exponential backoff; an unknown model or
+    any other API error moves on to the next one, and auth errors fail at
+    once since no other model would fare better. Only models skipped as
+    unavailable (404) make a later one the app-wide first choice.
+    With `progress` the response is streamed (see _stream_completion).
+    """
+    last_err = None
+    all_unavailable = True  # every model before this one was a 404
+    for i, model in enumerate(models_to_try()):
+        for attempt in range(MAX_ATTEMPTS):
+            if attempt:
+                await asyncio.sleep(RETRY_BASE_DELAY * 2 ** (attempt - 1))
+            try:
+                request = dict(
+                    model=model,
+                    **SAMPLING,
+                    max_tokens=max_tokens,
+                    messages=[
+                        {"role": "system", "content": system},
+                        {"role": "user", "content": user_msg}
+                    ],
+                    response_format={"type": "json_object"},
+                    timeout=timeout
+                )
+                if progress is None:
+                    resp = await get_openai_client().chat.completions.create(**request)
+                    content, finish_reason = resp.choices[0].message.content, resp.choices[0].finish_reason
+                else:
+                    content, finish_reason = await _stream_completion(request, progress)
+                # σε JSON mode, μη έγκυρο JSON σημαίνει ουσιαστικά κομμένη απάντηση
+                if finish_reason == "length":
+                    raise ValueError("Model response was truncated.")
+                result = parse(parse_model_json(content))
+                if i and all_unavailable:
+                    _model_memo()["good"] = model
+                return result
+            except (AuthenticationError, PermissionDeniedError) as e:
+                raise RuntimeError(f"OpenAI call failed: {e}") from e
+            except NotFoundError as e:
+                last_err = e
+                log.warning("Model %s unavailable: %s", model, e)
+                break
+            except Exception as e:
+                last_err = e
+                log.warning("Model %s failed: %s", model, e)
+                if isinstance(e, APIStatusError) and not _is_transient(e):
+                    all_unavailable = False
+                    break
+        else:
+            all_unavailable = False  # attempts used up on this model
+    raise RuntimeError(f"OpenAI call failed. Last error: {last_err}")
+
+
+def _question_prompt(theme: str, era: str, difficulty: str, asked: List[str],
+                     focus: Optional[str] = None) -> str:
+    # σταθερό κείμενο πρώτα, τα μεταβλητά πεδία στο τέλος
     user_msg = (
         f"Create ONE WORLD HISTORY multiple-choice question.\n"
+        f"Avoid duplicates from previous session questions if provided.\n"
         f"Theme: {theme}\n"
         f"Era/Region: {era or 'Any'}\n"
-        f"Difficulty: {difficulty}\n"
-        f"Avoid duplicates from previous session questions if provided."
+        f"Difficulty: {difficulty}"
     )
+    if focus:
+        user_msg += f"\nFocus on: {focus}"
 
-    asked = st.session_state.get("asked_questions", [])
     if asked:
-        user_msg += "\nAlready asked (avoid these topics):\n" + "\n".join(f"- {q}" for q in asked[-10:])
+        user_msg += "\nAlready asked (avoid these topics):\n" + "\n".join(f"- {tag}" for tag in asked[-ASKED_HISTORY:])
+    return user_msg
 
-    last_err = None
-    for model in MODEL_CANDIDATES:
-        try:
-            resp = client.chat.completions.create(
-                model=model,
-                temperature=0.6,
-                messages=[
+
+async def acall_openai_for_question(theme: str, era: str, difficulty: str, asked: List[str],
+                                    focus: Optional[str] = None,
+                                    progress: Optional[List[int]] = None) -> Dict[str, Any]:
+    user_msg = _question_prompt(theme, era, difficulty, asked, focus)
+    return await _complete_json(SYSTEM_SCHEMA, user_msg, timeout=30, max_tokens=MAX_TOKENS_PER_QUESTION,
+                                parse=validate_question, progress=progress)
+
+
+async def acall_openai_for_batch(theme: str, era: str, difficulty: str, k: int, asked: List[str]) -> List[Dict[str, Any]]:
+    """
+    Asks for `k` questions in a single request. Items that fail validation are
+    dropped, so the result may hold fewer than `k` questions (never more).
+
+    Runs on the shared event loop thread, so it must not touch st.* —
+    session data comes in as arguments.
+    """
+    user_msg = (
+        f"Avoid duplicates from previous session questions if provided.\n"
+        f"Create exactly {k} WORLD HISTORY multiple-choice questions.\n"
+        f"Theme: {theme}\n"
+        f"Era/Region: {era or 'Any'}\n"
+        f"Difficulty: {difficulty}"
+    )
+
+    if asked:
+        user_msg += "\nAlready asked (avoid these topics):\n" + "\n".join(f"- {tag}" for tag in asked[-ASKED_HISTORY:])
+
+    def parse(obj: Any) -> List[Dict[str, Any]]:
+        items = obj.get("questions") if isinstance(obj, dict) else None
+        if not isinstance(items, list):
+            raise ValueError("Missing field: questions")
+
+        questions = []
+        for item in items[:k]:
+            try:
+                questions.append(validate_question(item))
+            except Exception as e:
+                log.debug("Dropped invalid question: %s", e)
+        if not questions:
+            raise ValueError("No valid questions in batch.")
+        return questions
+
+    return await _complete_json(BATCH_SCHEMA, user_msg, timeout=60, max_tokens=k * MAX_TOKENS_PER_QUESTION,
+                                parse=parse)
+
+
+async def asubmit_quiz_batch(theme: str, era: str, difficulty: str, n: int, asked: List[str]) -> str:
+    """
+    Submits `n` single-question requests to the OpenAI Batch API (half price,
+    finishes within 24h) and returns the batch id.
+    """
+    client = get_openai_client()
+    model = models_to_try()[0]
+    lines = []
+    for i in range(n):
+        focus = FOCUS_HINTS[i % len(FOCUS_HINTS)] if n > 1 else None
+        lines.append(orjson.dumps({
+            "custom_id": f"q{i}",
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": model,
+                **SAMPLING,
+                "max_tokens": MAX_TOKENS_PER_QUESTION,
+                "messages": [
                     {"role": "system", "content": SYSTEM_SCHEMA},
-                    {"role": "user", "content": user_msg}
+                    {"role": "user", "content": _question_prompt(theme, era, difficulty, asked, focus)}
                 ],
-                timeout=30
-            )
-            raw = resp.choices[0].message.content
-            json_text = extract_json_block(raw)
-            obj = json.loads(json_text)
-            return validate_question(obj)
-        except Exception as e:
-            last_err = e
-            if DEBUG:
-                st.info(f"Model {model} failed: {e}")
+                "response_format": {"type": "json_object"},
+            },
+        }))
+    batch_file = await client.files.create(file=("quiz_batch.jsonl", b"\n".join(lines)), purpose="batch")
+    batch = await client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+    return batch.id
+
+
+async def afetch_quiz_batch(batch_id: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    Returns the batch's valid questions once it has completed, None while it
+    is still running. Raises if the batch failed, expired or was cancelled.
+    """
+    client = get_openai_client()
+    batch = await client.batches.retrieve(batch_id)
+    if batch.status in ("failed", "expired", "cancelled"):
+        raise RuntimeError(f"OpenAI batch {batch_id} {batch.status}.")
+    if batch.status != "completed":
+        return None
+    if not batch.output_file_id:
+        return []
+
+    output = await client.files.content(batch.output_file_id)
+    answers = {}
+    for line in output.text.splitlines():
+        if not line.strip():
             continue
-    raise RuntimeError(f"OpenAI call failed. Last error: {last_err}")
+        row = orjson.loads(line)
+        try:
+            body = row["response"]["body"]
+            obj = parse_model_json(body["choices"][0]["message"]["content"])
+            answers[row["custom_id"]] = validate_question(obj)
+        except Exception as e:
+            log.debug("Dropped batch result %s: %s", row.get("custom_id"), e)
+    # ίδια σειρά με το input (q0, q1, …)
+    return [answers[cid] for cid in sorted(answers, key=lambda c: int(c[1:]))]
+
+
+async def _gather_bounded(coros: List[Awaitable[Any]], limit: int) -> List[Any]:
+    """
+    Runs the coroutines concurrently, with at most `limit` in flight at once.
+    Results keep the order of `coros`; a coroutine that raised leaves its
+    exception in its slot instead of failing the others.
+    """
+    sem = asyncio.Semaphore(limit)
+
+    async def run(coro: Awaitable[Any]) -> Any:
+        async with sem:
+            return await coro
+
+    return await asyncio.gather(*(run(c) for c in coros), return_exceptions=True)
 
 
 # ============== SESSION STATE ==============
@@ -207,8 +369,15 @@ defaults = {
     "score": 0,
     "answered": False,
     "selected": None,
-    "asked_questions": [],
-    "start_time": time.time(),
+    "asked_questions": deque(maxlen=ASKED_HISTORY),  # topic_tag() of recent questions
+    "asked_seen": set(),  # normalized text of every question in this quiz
+    "repeats": 0,  # questions _add_questions dropped as repeats, see cached_questions
+    "start_time": time.monotonic(),
+    "quiz_salt": 0,  # cache salt for this quiz instance, see cached_questions
+    "_pending": [],  # [(count, Future)] questions still generating in the background
+    "_inflight": [],  # asyncio-side futures of this quiz's OpenAI requests
+    "_prefetch": None,  # Future of the next "Add 1 Question" question, started early
+    "_batch": None,  # (count, batch_id) of an in-flight Batch API job (cheap mode)
 }
 for k, v in defaults.items():
     st.session_state.setdefault(k, v)
@@ -228,6 +397,9 @@ with st.sidebar:
     era = st.text_input("Specific Era / Region (optional)", placeholder="e.g., Mesopotamia, Ming Dynasty, WWI Europe")
     difficulty = st.select_slider("Difficulty", options=["Easy", "Medium", "Hard"], value="Medium")
     total_q = st.slider("Number of Questions", 3, 15, 8)
+    cheap_mode = st.toggle("Cheap mode (async)", value=False,
+                           help="Generate the quiz via the OpenAI Batch API: half the cost, "
+                                "but it can take minutes (up to 24h) to be ready.")
     st.markdown("---")
     st.caption("Tip: Press **R** to rerun after changing settings.")
 
@@ -238,19 +410,231 @@ def reset_quiz():
     st.session_state.score = 0
     st.session_state.answered = False
     st.session_state.selected = None
-    st.session_state.asked_questions = []
-    st.session_state.start_time = time.time()
+    st.session_state.asked_questions = deque(maxlen=ASKED_HISTORY)
+    st.session_state.asked_seen = set()
+    st.session_state.repeats = 0
+    st.session_state.start_time = time.monotonic()
+    st.session_state.quiz_salt = random.randrange(1 << 30)
+    # ακυρώνει ό,τι τρέχει ακόμα για το παλιό quiz, όχι μόνο ό,τι δεν ξεκίνησε
+    for fut in st.session_state._inflight:
+        fut.cancel()
+    for _, fut in st.session_state._pending:
+        fut.cancel()
+    st.session_state._inflight = []
+    st.session_state._pending = []
+    st.session_state._prefetch = None
+    st.session_state._batch = None
     st.rerun()
 
+async def _generate_questions(theme: str, era: str, difficulty: str, need: int, asked: List[str],
+                              progress: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+    # ένα batch request για όλες, και παράλληλες μονές κλήσεις για ό,τι λείπει
+    if need == 1:
+        # μία ερώτηση που περιμένει ο χρήστης: streaming για γρήγορο πρώτο feedback
+        return [await acall_openai_for_question(theme, era, difficulty, asked, progress=progress)]
+    results = await acall_openai_for_batch(theme, era, difficulty, need, asked)
+    missing = need - len(results)
+    if missing > 0:
+        asked = asked + [topic_tag(q["question"]) for q in results]
+        # παράλληλες κλήσεις δεν βλέπουν η μία την άλλη — κάθε slot παίρνει άλλη οπτική
+        hints = [FOCUS_HINTS[i % len(FOCUS_HINTS)] if missing > 1 else None for i in range(missing)]
+        tasks = [acall_openai_for_question(theme, era, difficulty, asked, focus=h) for h in hints]
+        for res in await _gather_bounded(tasks, limit=MAX_CONCURRENCY):
+            # μια αποτυχημένη μονή κλήση δεν πετάει όσες ερωτήσεις ήρθαν ήδη
+            if isinstance(res, BaseException):
+                log.warning("Top-up question failed: %s", res)
+            else:
+                results.append(res)
+    return results
+
+@st.cache_data(ttl=QUESTION_CACHE_TTL, show_spinner=False)
+def cached_questions(theme: str, era: str, difficulty: str, need: int,
+                     _asked: Tuple[str, ...], nonce: int, salt: int, repeats: int,
+                     _progress: Optional[List[int]] = None,
+                     _inflight: Optional[List[Future]] = None) -> List[Dict[str, Any]]:
+    """
+    Memoized _generate_questions, keyed on the settings, `nonce` (the quiz
+    slot being filled) and `salt` (the quiz instance). `_asked` is left out
+    of the key (leading underscore) so it doesn't churn the cache. The first
+    quiz of every session uses salt 0 and so shares questions across sessions;
+    "New Quiz" picks a fresh salt. `repeats` changes whenever a cached answer
+    turned out to repeat an earlier question, so the refill is a fresh request
+    instead of the same cached repeat. `_progress` is passed through for streaming,
+    `_inflight` to _run_async so the quiz can cancel its requests.
+    Salt-0 misses fall through to the on-disk cache, which survives server
+    restarts; random salts live in session state, so nothing could read them back.
+    """
+    key = question_cache_key(theme, era, difficulty, need, nonce, salt, repeats)
+    if salt == 0:
+        cached = disk_cache_get(key)
+        if cached is not None:
+            return cached
+    results = _run_async(_generate_questions(theme, era, difficulty, need, list(_asked), _progress), _inflight)
+    if salt == 0:
+        disk_cache_put(key, results)
+    return results
+
+@st.cache_resource(show_spinner=False)
+def _prefetch_pool() -> ThreadPoolExecutor:
+    """Background workers for questions the user doesn't need to see yet."""
+    return ThreadPoolExecutor(max_workers=5, thread_name_prefix="quiz-prefetch")
+
+def _add_questions(results: List[Dict[str, Any]]):
+    """Appends new questions to the quiz, dropping any already asked.
+
+    Dropped ones leave the quiz short and bump `repeats`, so the next
+    ensure_quiz_built() tops it up with a fresh (uncached) request.
+    """
+    seen = st.session_state.asked_seen
+    for q in results:
+        norm = " ".join(q["question"].lower().split())
+        if norm in seen:
+            st.session_state.repeats += 1
+            continue
+        seen.add(norm)
+        q["_labels"] = [f"{i+1}. {opt}" for i, opt in enumerate(q["options"])]
+        st.session_state.quiz.append(q)
+        st.session_state.asked_questions.append(topic_tag(q["question"]))
+
+def _wait_with_progress(fut: Future, progress: List[int]) -> Any:
+    """Blocks on `fut`, with a status line that moves as streamed chunks arrive."""
+    status = st.empty()
+    shown = -1
+    while not fut.done():
+        step = progress[0] // 10  # ανανέωση κάθε ~10 chunks
+        if step != shown:
+            shown = step
+            if progress[0]:
+                status.caption("✍️ Composing question" + "." * (step % 3 + 1))
+            else:
+                status.caption("⏳ Waiting for OpenAI…")
+        time.sleep(0.05)
+    status.empty()
+    return fut.result()
+
+def collect_pending(wait: bool = False):
+    """
+    Moves finished background questions into the quiz. With `wait=True`
+    blocks (up to PENDING_TIMEOUT per batch) until all of them are in.
+    """
+    still_pending = []
+    pending, st.session_state._pending = st.session_state._pending, still_pending
+    for count, fut in pending:
+        if not (wait or fut.done()):
+            still_pending.append((count, fut))
+            continue
+        # έχει ήδη βγει από το _pending: αν απέτυχε, το επόμενο ensure_quiz_built() το ξαναζητά
+        try:
+            _add_questions(fut.result(timeout=PENDING_TIMEOUT))
+        except Exception as e:
+            fut.cancel()
+            st.error(f"Couldn't generate {count} question{'s' if count > 1 else ''}: {e}")
+
+def collect_batch() -> bool:
+    """
+    Polls the cheap-mode batch, if any, and adds its questions once done.
+    Returns True if the batch failed; it is dropped so that the caller can
+    generate the missing questions live instead.
+    """
+    if not st.session_state._batch:
+        return False
+    _, batch_id = st.session_state._batch
+    try:
+        results = _run_async(afetch_quiz_batch(batch_id))
+    except Exception as e:
+        st.session_state._batch = None
+        st.error(f"Batch generation failed, generating the questions directly instead: {e}")
+        return True
+    if results is not None:
+        st.session_state._batch = None
+        _add_questions(results)
+    return False
+
 def ensure_quiz_built():
-    need = total_q - len(st.session_state.quiz)
+    if len(st.session_state.quiz) >= total_q:
+        return
+    # ένα build τη φορά — διπλά κλικ δεν ξαναστέλνουν τις ίδιες κλήσεις
+    if st.session_state.get("_building"):
+        return
+    collect_pending()
+    batch_failed = collect_batch()
+    pending = sum(count for count, _ in st.session_state._pending)
+    if st.session_state._batch:
+        pending += st.session_state._batch[0]
+    need = total_q - len(st.session_state.quiz) - pending
     if need <= 0:
         return
+    st.session_state["_building"] = True
+    try:
+        if cheap_mode and not batch_failed:
+            asked = list(st.session_state.asked_questions)
+            batch_id = _run_async(asubmit_quiz_batch(theme, era, difficulty, need, asked))
+            st.session_state._batch = (need, batch_id)
+            return
+        # χωρίς ερωτήσεις ακόμα: η πρώτη τώρα, οι υπόλοιπες στο background
+        first_build = not st.session_state.quiz
+        if first_build:
+            with st.spinner("Generating questions from OpenAI…"):
+                asked = tuple(st.session_state.asked_questions)
+                progress = [0]
+                fut = _prefetch_pool().submit(cached_questions, theme, era, difficulty, 1, asked, 0,
+                                              st.session_state.quiz_salt, st.session_state.repeats,
+                                              progress, st.session_state._inflight)
+                try:
+                    _add_questions(_wait_with_progress(fut, progress))
+                except Exception as e:
+                    # όπως στο collect_pending: μήνυμα εδώ, το Retry το δείχνει το QUIZ FLOW
+                    st.error(f"Couldn't generate the first question: {e}")
+                    return
+            need -= 1
+        if need > 0:
+            asked = tuple(st.session_state.asked_questions)
+            nonce = len(st.session_state.quiz) + pending
+            fut = _prefetch_pool().submit(cached_questions, theme, era, difficulty, need, asked, nonce,
+                                          st.session_state.quiz_salt, st.session_state.repeats,
+                                          None, st.session_state._inflight)
+            st.session_state._pending.append((need, fut))
+            if not first_build:
+                # π.χ. ο χρήστης ανέβασε το slider στη μέση του quiz
+                st.toast(f"➕ {need} more question{'s' if need > 1 else ''} loading…")
+    finally:
+        st.session_state["_building"] = False
+
+def _submit_extra_question() -> Future:
+    asked = tuple(st.session_state.asked_questions)
+    return _prefetch_pool().submit(cached_questions, theme, era, difficulty, 1, asked, len(st.session_state.quiz),
+                                   st.session_state.quiz_salt, st.session_state.repeats,
+                                   None, st.session_state._inflight)
+
+def prefetch_extra_question():
+    """Starts the question "Add 1 Question" would add, while the user reads the feedback."""
+    if st.session_state._prefetch is None and not st.session_state._pending:
+        st.session_state._prefetch = _submit_extra_question()
+
+def add_one_question():
+    """
+    Appends one question past total_q, reusing the prefetched one if there is
+    one. A prefetch that failed or came back as a repeat gets one fresh request.
+    """
+    fut = st.session_state._prefetch
+    st.session_state._prefetch = None
+    before = len(st.session_state.quiz)
+    err = None
     with st.spinner("Generating questions from OpenAI…"):
-        for _ in range(need):
-            q = call_openai_for_question(theme, era, difficulty)
-            st.session_state.quiz.append(q)
-            st.session_state.asked_questions.append(q["question"])
+        for _ in range(2):
+            fut = fut or _submit_extra_question()
+            try:
+                _add_questions(fut.result(timeout=PENDING_TIMEOUT))
+            except Exception as e:
+                fut.cancel()
+                err = e
+            if len(st.session_state.quiz) > before:
+                return
+            fut = None  # παλιό σφάλμα ή επανάληψη — νέα κλήση, με νέο cache key
+    if err is not None:
+        st.error(f"Couldn't generate a question: {err}")
+    else:
+        st.warning("The model only repeated earlier questions — try again.")
 
 # ============== UI CONTROLS ==============
 colA, colB = st.columns(2)
@@ -259,22 +643,56 @@ with colA:
         reset_quiz()
 with colB:
     if st.button("➕ Add 1 Question"):
-        ensure_quiz_built()
+        add_one_question()
 
-ensure_quiz_built()
+if len(st.session_state.quiz) < total_q:
+    ensure_quiz_built()
 
 # meta header
-elapsed = int(time.time() - st.session_state.start_time)
-mins, secs = divmod(elapsed, 60)
 st.markdown(
     f"<span class='badge'>Theme: {theme}</span>"
     f"<span class='badge'>Difficulty: {difficulty}</span>"
-    f"<span class='badge'>Questions: {len(st.session_state.quiz)}</span>"
-    f"<span class='badge'>Time: {mins}m {secs}s</span>",
+    f"<span class='badge'>Questions: {len(st.session_state.quiz)}</span>",
     unsafe_allow_html=True
 )
 
+# Ο χρόνος μετράει στον browser: δεν χρειάζεται rerun για να ανανεωθεί.
+# Ο server στέλνει μόνο πόσα ms έχουν περάσει (monotonic), όχι wall-clock epoch.
+TIMER_HTML = """
+<style>body {{ margin:0; background:transparent; font-family:'Source Sans Pro', sans-serif; }}</style>
+<span id="qz-timer" data-elapsed="{elapsed_ms}"
+      style="display:inline-block; padding:2px 8px; border-radius:6px; font-size:14px;
+             background:#21335c; color:#d9e4ff; border:1px solid rgba(255,255,255,.15);">Time: 0m 0s</span>
+<script>
+  const el = document.getElementById("qz-timer");
+  const start = Date.now() - Number(el.dataset.elapsed);
+  const tick = () => {{
+    const s = Math.max(0, Math.floor((Date.now() - start) / 1000));
+    el.textContent = `Time: ${{Math.floor(s / 60)}}m ${{s % 60}}s`;
+  }};
+  tick();
+  setInterval(tick, 1000);
+</script>
+"""
+elapsed_ms = int((time.monotonic() - st.session_state.start_time) * 1000)
+st.iframe(TIMER_HTML.format(elapsed_ms=elapsed_ms), height=30)
+
 # ============== QUIZ FLOW ==============
+if st.session_state.current >= len(st.session_state.quiz) and st.session_state._pending:
+    with st.spinner("Generating questions from OpenAI…"):
+        collect_pending(wait=True)
+
+if st.session_state.current >= len(st.session_state.quiz) and st.session_state._batch:
+    st.info("⏳ Your questions are being generated via the OpenAI Batch API. "
+            "This can take a few minutes — check back soon.")
+    st.button("🔄 Check status")
+    st.stop()
+
+if st.session_state.current >= len(st.session_state.quiz) and len(st.session_state.quiz) < total_q:
+    # κάποιο build απέτυχε (το μήνυμα βγήκε ήδη) — όχι results με μισό quiz
+    st.button("🔄 Retry")
+    st.stop()
+
 if st.session_state.current >= len(st.session_state.quiz):
     total = len(st.session_state.quiz)
     score = st.session_state.score
@@ -301,7 +719,8 @@ st.markdown(f"<div class='quiz-card'><b>{q['question']}</b></div>", unsafe_allow
 
 choice = st.radio(
     "Choose your answer:",
-    options=[f"{i+1}. {opt}" for i, opt in enumerate(q['options'])],
+    options=range(len(q["_labels"])),
+    format_func=lambda i: q["_labels"][i],
     index=None,
     key=f"q_{st.session_state.current}"
 )
@@ -313,8 +732,7 @@ if col1.button("✅ Submit") and not st.session_state.answered:
     if choice is None:
         st.warning("Select an option first 🙂")
     else:
-        sel = int(choice.split(".")[0]) - 1
-        if sel == q["correct_index"]:
+        if choice == q["correct_index"]:
             st.session_state.score += 1
             feedback.success(f"Correct! ✅\n\n{q['explanation']}")
         else:
@@ -326,13 +744,16 @@ if col2.button("⏭️ Skip") and not st.session_state.answered:
     st.session_state.answered = True
 
 if st.session_state.answered:
+    # τελευταία ερώτηση: ετοιμάζουμε ήδη την επόμενη για το "Add 1 Question"
+    if st.session_state.current + 1 >= len(st.session_state.quiz):
+        prefetch_extra_question()
     if st.button("Next ➡️"):
         st.session_state.current += 1
         st.session_state.answered = False
         st.session_state.selected = None
         st.rerun()
 
-st.markdown("<br><p style='text-align:center;color:#9aa4b2'>Powered by OpenAI • Model: gpt-4o-mini • Streamlit</p>", unsafe_allow_html=True)
+st.markdown(f"<br><p style='text-align:center;color:#9aa4b2'>Powered by OpenAI • Model: {models_to_try()[0]} • Streamlit</p>", unsafe_allow_html=True)
 
 
 
@@ -0,0 +1,260 @@
+# quiz_lib.py
+"""
+Streamlit-free helpers for the quiz: prompts, model list, parsing /
+validation of model output and the on-disk question cache. Kept out of
+main.py so they are compiled and executed once per process instead of on
+every Streamlit rerun.
+"""
+import hashlib
+import re
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+import orjson
+from pydantic import BaseModel, field_validator, model_validator
+
+MODEL_CANDIDATES = ["gpt-4o-mini", "gpt-4o", "gpt-3.5-turbo"]
+
+_FENCE_RE = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.S | re.I)
+_SCAN_RE = re.compile(r'[{}"\\]')  # braces, plus quotes/escapes to skip strings
+
+def extract_json_block(text: str) -> str:
+    """
+    Robust extraction of a JSON object from LLM text.
+    - Tries plain JSON (the common case, the prompt asks for JSON only)
+    - Tries fenced ```json blocks
+    - Falls back to a linear balanced-braces scan that skips string contents
+    """
+    if not text:
+        raise ValueError("Empty model response.")
+
+    txt = text.strip()
+    if "{" not in txt:
+        raise ValueError("No JSON object found in model response.")
+
+    # 1) try direct JSON
+    try:
+        orjson.loads(txt)
+        return txt
+    except orjson.JSONDecodeError:
+        pass
+
+    # 2) fenced ```json ... ``` (ή σκέτο ```)
+    m = _FENCE_RE.search(txt)
+    if m:
+        return m.group(1)
+
+    # 3) balanced braces scan (χωρίς recursion), αγνοεί braces μέσα σε strings
+    start = txt.find("{")
+    depth = 0
+    in_str = False
+    skip = -1  # position of a backslash-escaped char inside a string
+    end: Optional[int] = None
+    for m in _SCAN_RE.finditer(txt, start):
+        i = m.start()
+        if i == skip:
+            continue
+        ch = m.group()
+        if in_str:
+            if ch == "\\":
+                skip = i + 1
+            elif ch == '"':
+                in_str = False
+        elif ch == '"':
+            in_str = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                end = i + 1
+                break
+    if end is None:
+        raise ValueError("Unbalanced JSON braces in model response.")
+    return txt[start:end]
+
+
+# question boilerplate ("Which of the following was the…") says nothing about the topic
+_TAG_STOPWORDS = frozenset("""
+a an the of in on at to for by from with and or as into during between
+what which who whom whose when where why how
+is was were are be been did do does had has have
+this that these those following best most
+""".split())
+_WORD_RE = re.compile(r"[\w'-]+")
+
+
+def topic_tag(question: str, words: int = 6) -> str:
+    """
+    Short fingerprint of a question for the "already asked" prompt list: its
+    first `words` content words, e.g. "capital Byzantine Empire".
+    """
+    tokens = _WORD_RE.findall(question)
+    content = [w for w in tokens if w.lower() not in _TAG_STOPWORDS]
+    return " ".join((content or tokens)[:words])
+
+
+def parse_model_json(raw: Optional[str]) -> Any:
+    """
+    Parses a JSON-mode response. With response_format=json_object the content
+    is already plain JSON; extract_json_block is only the fallback.
+    """
+    try:
+        return orjson.loads(raw)
+    except (TypeError, orjson.JSONDecodeError):
+        return orjson.loads(extract_json_block(raw))
+
+
+_PLACEHOLDER = "None of the above {}"  # fills a blank/missing option slot
+
+
+class Question(BaseModel):
+    """
+    One quiz question as the model should send it. The validators coerce and
+    normalize instead of rejecting where the old hand-written checks did.
+    """
+    question: str
+    options: List[str]
+    correct_index: int
+    explanation: str
+
+    @field_validator("question", mode="before")
+    @classmethod
+    def _strip_question(cls, v: Any) -> str:
+        return str(v).strip()
+
+    @field_validator("options", mode="before")
+    @classmethod
+    def _four_options(cls, v: Any) -> List[str]:
+        # normalize to exactly 4 options in one pass; blank/missing slots get a
+        # placeholder in place, so correct_index still points at the same answer
+        if not isinstance(v, (list, tuple)):
+            raise ValueError("options must be an array.")
+        src = v[:4]
+        options = [""] * 4
+        filled = 0
+        for i in range(4):
+            opt = str(src[i]).strip() if i < len(src) else ""
+            if opt:
+                options[i] = opt
+                filled += 1
+            else:
+                options[i] = _PLACEHOLDER.format(i)
+        if filled < 2:
+            raise ValueError("Not enough options.")
+        return options
+
+    @field_validator("correct_index", mode="before")
+    @classmethod
+    def _check_index(cls, v: Any) -> int:
+        if not isinstance(v, int) or not (0 <= v < 4):
+            raise ValueError("Invalid correct_index.")
+        return v
+
+    @field_validator("explanation", mode="before")
+    @classmethod
+    def _default_explanation(cls, v: Any) -> str:
+        exp = str(v).strip()
+        return exp if len(exp) >= 3 else "No explanation provided."
+
+    @model_validator(mode="after")
+    def _correct_is_real(self) -> "Question":
+        # ο placeholder δεν μπορεί να είναι η σωστή απάντηση
+        if self.options[self.correct_index] == _PLACEHOLDER.format(self.correct_index):
+            raise ValueError("correct_index points at a blank option.")
+        return self
+
+
+def validate_question(obj: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Expected:
+    {
+      "question": str,
+      "options": [str, str, str, str],
+      "correct_index": int (0..3),
+      "explanation": str
+    }
+    Raises pydantic.ValidationError (a ValueError) when it can't be fixed up.
+    """
+    return Question.model_validate(obj).model_dump()
+
+
+# Concurrent single-question calls can't see each other's output, so each
+# slot gets its own angle to keep the questions from overlapping.
+FOCUS_HINTS = [
+    "rulers, states & politics",
+    "wars, battles & treaties",
+    "trade & economy",
+    "religion, art & culture",
+    "science, technology & inventions",
+    "society & everyday life",
+    "exploration & geography",
+]
+
+
+SYSTEM_SCHEMA = """You are a quiz author. Output ONLY one JSON object with fields:
+- "question": string (concise, single-sentence)
+- "options": array of 4 short, plausible, distinct answers (strings)
+- "correct_index": integer 0..3 (index in "options")
+- "explanation": string (1–2 sentences, factual, neutral)
+No markdown, no code fences, no commentary. JSON only.
+"""
+
+BATCH_SCHEMA = """You are a quiz author. Output ONLY one JSON object of the form:
+{"questions": [ {...}, {...}, ... ]}
+with exactly the requested number of items. Each item has fields:
+- "question": string (concise, single-sentence)
+- "options": array of 4 short, plausible, distinct answers (strings)
+- "correct_index": integer 0..3 (index in "options")
+- "explanation": string (1–2 sentences, factual, neutral)
+Every question must cover a different topic.
+No markdown, no code fences, no commentary. JSON only.
+"""
+
+
+# ============== DISK CACHE ==============
+DISK_CACHE_PATH = Path.home() / ".cache" / "worldhistory_quiz.db"
+# shared with the in-memory st.cache_data layer: the salt-0 questions every
+# new session starts with rotate hourly, whether or not the server restarted
+QUESTION_CACHE_TTL = 60 * 60  # seconds
+
+
+def question_cache_key(*parts: Any) -> str:
+    return hashlib.blake2b("|".join(map(str, parts)).encode(), digest_size=16).hexdigest()
+
+
+def _disk_cache() -> sqlite3.Connection:
+    DISK_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(DISK_CACHE_PATH, timeout=5)
+    db.execute("CREATE TABLE IF NOT EXISTS questions (key TEXT PRIMARY KEY, json TEXT, created REAL)")
+    return db
+
+
+def disk_cache_get(key: str) -> Optional[Any]:
+    """Cached value for `key`, or None if missing, expired or the db is unusable."""
+    try:
+        with closing(_disk_cache()) as db:
+            row = db.execute("SELECT json, created FROM questions WHERE key = ?", (key,)).fetchone()
+    except (OSError, sqlite3.Error):
+        return None
+    if row is None or time.time() - row[1] > QUESTION_CACHE_TTL:
+        return None
+    return orjson.loads(row[0])
+
+
+def disk_cache_put(key: str, value: Any) -> None:
+    """
+    Best effort: a read-only or locked cache must never break the quiz.
+    Expired rows are purged on every write, so the db stays small.
+    """
+    now = time.time()
+    try:
+        with closing(_disk_cache()) as db, db:
+            db.execute("DELETE FROM questions WHERE created < ?", (now - QUESTION_CACHE_TTL,))
+            db.execute("INSERT OR REPLACE INTO questions VALUES (?, ?, ?)",
+                       (key, orjson.dumps(value).decode(), now))
+    except (OSError, sqlite3.Error):
+        pass